@@ -0,0 +1,161 @@
+import argparse
+import glob
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+# song_repository silences the TerminusDB warnings, so it is imported
+# before terminusdb_client.
+from song_repository import connect_server, fetch_song_properties, \
+    head_commit
+from terminusdb_client import WOQLQuery, WOQLClient
+
+# Properties every scm:Song must have, with the cardinality declared for
+# them in add_schema (None where no cardinality is declared).
+SONG_PROPERTIES = {
+    "artist": 1,
+    "length": 1,
+    "album": None,
+}
+
+
+def list_song_iris(song_client: WOQLClient) -> List[str]:
+    """Returns the IRI of every scm:Song, in a single query."""
+    song_query = WOQLQuery().select("v:song") \
+        .triple("v:song", "rdf:type", "scm:Song").execute(song_client)
+
+    return [binding['song'] for binding in song_query.get("bindings")]
+
+
+def shard_of(iri: str, shards: int) -> int:
+    """Returns the shard an IRI belongs to. crc32 is used rather than
+    hash() so that the partitioning is the same in every process."""
+    return zlib.crc32(iri.encode("utf-8")) % shards
+
+
+def partition(iris: List[str], shards: int) -> List[List[str]]:
+    """Splits the IRIs into shards by hash."""
+    partitions = [[] for _ in range(shards)]
+    for iri in iris:
+        partitions[shard_of(iri, shards)].append(iri)
+    return partitions
+
+
+def verify_song(properties: Dict[str, list]) -> List[str]:
+    """Returns the problems found with a single song's properties."""
+    problems = []
+    for name, cardinality in SONG_PROPERTIES.items():
+        values = properties.get(name, [])
+        if not values:
+            problems.append("missing " + name)
+            continue
+        if cardinality is not None and len(values) != cardinality:
+            problems.append(name + " has " + str(len(values)) +
+                            " values, expected " + str(cardinality))
+
+        for value in values:
+            if not str(value).strip():
+                problems.append("empty " + name)
+            elif name == "length" and \
+                    not (str(value).isdigit() and int(value) > 0):
+                problems.append("length " + str(value) +
+                                " is not a positive number of seconds")
+    return problems
+
+
+def export_shard(job: Tuple[str, str, int, List[str], str]) -> dict:
+    """Exports and verifies one shard of songs as of commit in a worker
+    process, writing them to songs-<shard>.jsonl in out_dir."""
+    dbid, commit, shard, iris, out_dir = job
+    songs = fetch_song_properties(connect_server(dbid, commit), iris)
+
+    report = {"shard": shard, "songs": len(songs), "problems": {}}
+    shard_path = os.path.join(out_dir, "songs-%05d.jsonl" % shard)
+    with open(shard_path, "w") as shard_file:
+        for iri, properties in songs.items():
+            shard_file.write(json.dumps({"iri": iri,
+                                         "properties": properties}) + "\n")
+            problems = verify_song(properties)
+            if problems:
+                report["problems"][iri] = problems
+    return report
+
+
+def merge_reports(reports: List[dict]) -> dict:
+    """Combines the per-shard reports into one catalog report."""
+    merged = {"shards": len(reports), "songs": 0, "invalid": 0,
+              "problems": {}}
+    for report in sorted(reports, key=lambda report: report["shard"]):
+        merged["songs"] += report["songs"]
+        merged["invalid"] += len(report["problems"])
+        merged["problems"].update(report["problems"])
+    return merged
+
+
+def export_catalog(dbid: str, out_dir: str, shards: int,
+                   workers: int) -> dict:
+    """Exports every song in dbid to out_dir in parallel and returns
+    the merged verification report, also written to report.json.
+    Files left in out_dir by an earlier export are removed first.
+
+    The listing and every worker read the same commit, the head of the
+    branch when the export starts, so edits committed during the export
+    are not part of it."""
+    os.makedirs(out_dir, exist_ok=True)
+    for old_path in glob.glob(os.path.join(out_dir, "songs-*.jsonl")) + \
+            glob.glob(os.path.join(out_dir, "report.json")):
+        os.remove(old_path)
+
+    song_client = connect_server(dbid)
+    commit = head_commit(song_client)
+    song_client.ref(commit)
+    iris = list_song_iris(song_client)
+    jobs = [(dbid, commit, shard, shard_iris, out_dir)
+            for shard, shard_iris in enumerate(partition(iris, shards))]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        report = merge_reports(list(pool.map(export_shard, jobs)))
+    report["commit"] = commit
+
+    with open(os.path.join(out_dir, "report.json"), "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    return report
+
+
+def positive_int(text: str) -> int:
+    """argparse type for counts that must be at least one."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export and verify every song in the catalog.")
+    parser.add_argument("--db", default="a231songs",
+                        help="database to export")
+    parser.add_argument("--out", default="export",
+                        help="directory for the shard files and report")
+    parser.add_argument("--shards", type=positive_int,
+                        default=os.cpu_count() or 1,
+                        help="number of shard files to write")
+    parser.add_argument("--workers", type=positive_int,
+                        default=os.cpu_count() or 1,
+                        help="number of worker processes")
+    args = parser.parse_args()
+
+    report = export_catalog(args.db, args.out, args.shards, args.workers)
+
+    print("Exported " + str(report["songs"]) + " song(s) as of commit " +
+          report["commit"] + " into " + str(report["shards"]) +
+          " shard(s) in " + args.out + ".")
+    for iri, problems in report["problems"].items():
+        print(iri + ": " + ", ".join(problems))
+    print(str(report["invalid"]) + " song(s) failed verification.")
+
+
+if __name__ == "__main__":
+    main()
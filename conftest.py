@@ -0,0 +1,2 @@
+# Lets the tests under tests/ import the scripts' modules from the
+# repository root.
@@ -1,3 +1,4 @@
+import os
 import warnings
 
 # Addressing a known issue regarding warnings in the TerminusDB code
@@ -11,19 +12,16 @@ warnings.filterwarnings("ignore", message="woqlview need "
 # access to the a231songs database.
 from terminusdb_client import WOQLQuery, WOQLClient
 
+from song_journal import JournalInUseError, SongJournal, queued_message
+from song_repository import SEARCH_FIELDS, ServerUnavailableError, \
+    SongRepository, TerminusSongRepository, print_songs, search_songs
+from song_repository import connect_server as connect_db
+
 
 def connect_server() -> WOQLClient:
     """Connects to the local server and returns a client."""
-    server_url = "https://127.0.0.1:6363"
-    user = "admin"
-    account = "admin"
-    key = "root"
-    dbid = "a231songs"
-
-    song_client = WOQLClient(server_url)
-    song_client.connect(user=user, account=account, key=key, db=dbid)
+    return connect_db("a231songs")
 
-    return song_client
 
 # Assertion commented out to save memory.
 # assertion_server = WOQLClient("https://127.0.0.1:6363")
@@ -51,79 +49,59 @@ def add_schema(song_client: WOQLClient) -> None:
 
 
 def add_song(song_title: str, song_length: str, song_artist: str,
-             song_album, song_client) -> None:
-    """Adds a song to the database."""
-    message = "Added: " + song_title + "\n"
-
-    query = WOQLQuery().woql_and(
-            WOQLQuery().insert("doc:" + str(song_title), "scm:Song")
-            .property("scm:artist", str(song_artist))
-            .property("scm:length", str(song_length))
-            .property("scm:album", str(song_album))
-    )
-    query.execute(song_client, message)
+             song_album, song_journal: SongJournal) -> None:
+    """Queues a song to be added to the database."""
+    pending = song_journal.add_song(str(song_title), str(song_length),
+                                    str(song_artist), str(song_album))
 
-    print(message)
+    print(queued_message("adding " + song_title, pending))
 
 
-def view_songs(song_client: WOQLClient) -> None:
+def view_songs(song_repository: SongRepository) -> None:
     """Prints out the songs in the database."""
-    song_query = WOQLQuery() \
-        .limit(100) \
-        .triple("v:song_length", "v:artist", "v:album").execute(song_client)
-
-    query_results = song_query.get("bindings")
-    zip_of_queries = zip(*(iter(query_results),) * 4)
-    list_of_queries = list(zip_of_queries)
+    try:
+        songs = song_repository.songs()
+    except ServerUnavailableError:
+        print("Could not reach the database, please try again later.\n")
+        return
 
     print("Songs in Database:\n")
-    for query in list_of_queries:
-        print("Song Name: " + query[0]['song_length'].split("data/")[1])
-        print("Song Album: " + query[1]['album']['@value'])
-        print("Song Artist: " + query[2]['album']['@value'])
-        print("Song Length: " + str(query[3]['album']['@value']))
-        print()
+    print_songs(songs)
 
 
-def remove_song(song_to_remove: str, song_client: WOQLClient) -> None:
-    """Removes a song based on the entered title."""
-    WOQLQuery().delete_object("doc:" + song_to_remove) \
-        .execute(song_client, "Deleted" + song_to_remove)
+def remove_song(song_to_remove: str, song_journal: SongJournal) -> None:
+    """Queues removal of a song based on the entered title."""
+    pending = song_journal.remove_song(song_to_remove)
 
-    print("Removed " + song_to_remove + ", if it was present.")
+    print(queued_message("removing " + song_to_remove +
+                         ", if it is present", pending))
 
 
 def edit_song_artist(title: str, new_artist: str,
-                     song_client: WOQLClient) -> None:
-    """Edits a song's artist'."""
-    WOQLQuery().woql_and(
-        WOQLQuery().triple("doc:" + title, "scm:artist", "v:artist"),
-        WOQLQuery().delete_triple("doc:" + title, "scm:artist", "v:artist"),
-        WOQLQuery().add_triple("doc:" + title, "scm:artist", new_artist),
-    ).execute(song_client, "Testing edit_song")
+                     song_journal: SongJournal) -> None:
+    """Queues an edit of a song's artist."""
+    pending = song_journal.edit_song(title, "scm:artist", new_artist)
+
+    print(queued_message("the new artist of " + title, pending))
 
 
 def edit_song_album(title: str, new_album: str,
-                    song_client: WOQLClient) -> None:
-    """Edits a song's album."""
-    WOQLQuery().woql_and(
-        WOQLQuery().triple("doc:" + title, "scm:album", "v:album"),
-        WOQLQuery().delete_triple("doc:" + title, "scm:album", "v:album"),
-        WOQLQuery().add_triple("doc:" + title, "scm:album", new_album),
-    ).execute(song_client, "Testing edit_song")
+                    song_journal: SongJournal) -> None:
+    """Queues an edit of a song's album."""
+    pending = song_journal.edit_song(title, "scm:album", new_album)
+
+    print(queued_message("the new album of " + title, pending))
 
 
 def edit_song_length(title: str, new_length: int,
-                     song_client: WOQLClient) -> None:
-    """Edits a song's length."""
-    WOQLQuery().woql_and(
-        WOQLQuery().triple("doc:" + title, "scm:length", "v:length"),
-        WOQLQuery().delete_triple("doc:" + title, "scm:length", "v:length"),
-        WOQLQuery().add_triple("doc:" + title, "scm:length", str(new_length)),
-    ).execute(song_client, "Testing edit_song")
+                     song_journal: SongJournal) -> None:
+    """Queues an edit of a song's length."""
+    pending = song_journal.edit_song(title, "scm:length", str(new_length))
+
+    print(queued_message("the new length of " + title, pending))
 
 
-def edit_menu(song_client: WOQLClient) -> None:
+def edit_menu(song_journal: SongJournal) -> None:
     """Menu for choosing which attribute to edit."""
     choice = input("Please enter a decision.\n"
                    "[1] Change a song's artist.\n"
@@ -135,14 +113,14 @@ def edit_menu(song_client: WOQLClient) -> None:
             song_title = input("Please enter the song title. ")
 
             new_artist = input("Please enter the new artist.")
-            edit_song_artist(song_title, new_artist, song_client)
+            edit_song_artist(song_title, new_artist, song_journal)
             break
 
         elif int(choice) == 2:
             song_title = input("Please enter the song title. ")
 
             new_album = input("Please enter the new album. ")
-            edit_song_album(song_title, new_album, song_client)
+            edit_song_album(song_title, new_album, song_journal)
             break
 
         elif int(choice) == 3:
@@ -158,155 +136,55 @@ def edit_menu(song_client: WOQLClient) -> None:
                 if int(new_length) > 0:
                     positive_integer = True
 
-            edit_song_length(song_title, new_length, song_client)
+            edit_song_length(song_title, new_length, song_journal)
             break
         else:
             print("The option that you have inputted is invalid. Try again.")
 
 
-def add_menu(song_client: WOQLClient) -> None:
+def add_menu(song_journal: SongJournal) -> None:
     """Series of prompts to add a song."""
     name = input("Please enter the song's name. ")
     album = input("Please enter the album. ")
     artist = input("Please enter the artist. ")
     length = input("Please enter the length. ")
 
-    add_song(name, length, artist, album, song_client)
+    add_song(name, length, artist, album, song_journal)
 
 
-def remove_menu(song_client: WOQLClient) -> None:
+def remove_menu(song_journal: SongJournal) -> None:
     """Prompt for singular removal of a song."""
     song_to_remove = input("Please enter a song title "
                            "to remove from the database: ")
 
-    remove_song(song_to_remove, song_client)
+    remove_song(song_to_remove, song_journal)
 
 
-def find_menu(song_client: WOQLClient) -> None:
-    song_query = WOQLQuery() \
-        .limit(100) \
-        .triple("v:song_length", "v:artist", "v:album").execute(song_client)
-
-    query_results = song_query.get("bindings")
-    zip_of_queries = zip(*(iter(query_results),) * 4)
-    list_of_queries = list(zip_of_queries)
-
+def find_menu(song_repository: SongRepository) -> None:
+    """Prompts for a category and value and prints the matching songs."""
     while True:
         choice = input("What category do you want to search by?\n"
                        "[1] Search by song name.\n"
                        "[2] Search by song album.\n"
                        "[3] Search by song artist.\n"
                        "[4] Search by song length.\n")
-        if (int(choice) == 1):
-            song_name = input("Enter the name of the song that you are"
-                              "searching for: ")
-            list_of_indexes = []
-            index = 0
-            for query in list_of_queries:
-                if (song_name == query[0]['song_length'].split("data/")[1]):
-                    list_of_indexes.append(index)
-                index += 1
-                    
-            print("\nFound " + str(len(list_of_indexes)) +
-                    " instance(s) of the song " + song_name +
-                    " in the Database\n")
-            for index in list_of_indexes:
-                print("Song Name: " + list_of_queries[index][0]
-                                        ['song_length'].split("data/")[1])
-                print("Song Album: " + list_of_queries[index][1]
-                                        ['album']['@value'])
-                print("Song Artist: " + list_of_queries[index][2]
-                                        ['album']['@value'])
-                print("Song Length: " + str(list_of_queries[index][3]
-                                            ['album']['@value']))
-                print()
-            
-            break
-
-        elif (int(choice) == 2):
-            song_album = input("Enter the album of the song that you are"
-                              "searching for: ")
-            list_of_indexes = []
-            index = 0
-            for query in list_of_queries:
-                if (song_album == query[1]['album']['@value']):
-                    list_of_indexes.append(index)
-                index += 1
-                    
-            print("\nFound " + str(len(list_of_indexes)) +
-                    " instance(s) of the album" + song_album +
-                    " in the Database\n")
-            for index in list_of_indexes:
-                print("Song Name: " + list_of_queries[index][0]
-                                        ['song_length'].split("data/")[1])
-                print("Song Album: " + list_of_queries[index][1]
-                                        ['album']['@value'])
-                print("Song Artist: " + list_of_queries[index][2]
-                                        ['album']['@value'])
-                print("Song Length: " + str(list_of_queries[index][3]
-                                            ['album']['@value']))
-                print()
-
-            break
-
-        elif (int(choice) == 3):
-            song_artist = input("Enter the artist of the song that you are"
-                              "searching for: ")
-            list_of_indexes = []
-            index = 0
-            for query in list_of_queries:
-                if (song_artist == query[2]['album']['@value']):
-                    list_of_indexes.append(index)
-                index += 1
-                    
-            print("\nFound " + str(len(list_of_indexes)) +
-                    " instance(s) of the artist " + song_artist +
-                    " in the Database\n")
-            for index in list_of_indexes:
-                print("Song Name: " + list_of_queries[index][0]
-                                        ['song_length'].split("data/")[1])
-                print("Song Album: " + list_of_queries[index][1]
-                                        ['album']['@value'])
-                print("Song Artist: " + list_of_queries[index][2]
-                                        ['album']['@value'])
-                print("Song Length: " + str(list_of_queries[index][3]
-                                            ['album']['@value']))
-                print()
-            
-            break
-        
-        elif (int(choice) == 4):
-            song_length = input("Enter the length of the song that you are"
-                              "searching for: ")
-            list_of_indexes = []
-            index = 0
-            for query in list_of_queries:
-                if (int(song_length) == query[3]['album']['@value']):
-                    list_of_indexes.append(index)
-                index += 1
-                    
-            print("\nFound " + str(len(list_of_indexes)) +
-                    " instance(s) of length " + song_length +
-                    " in the Database\n")
-            for index in list_of_indexes:
-                print("Song Name: " + list_of_queries[index][0]
-                                        ['song_length'].split("data/")[1])
-                print("Song Album: " + list_of_queries[index][1]
-                                        ['album']['@value'])
-                print("Song Artist: " + list_of_queries[index][2]
-                                        ['album']['@value'])
-                print("Song Length: " + str(list_of_queries[index][3]
-                                            ['album']['@value']))
-                print()
-
+        if int(choice) in SEARCH_FIELDS:
+            field = SEARCH_FIELDS[int(choice)][0]
+            value = input("Enter the " + field + " of the song that you are "
+                          "searching for: ")
+            try:
+                search_songs(song_repository, int(choice), value)
+            except ServerUnavailableError:
+                print("Could not reach the database, "
+                      "please try again later.\n")
             break
 
         else:
             print("The option that you have inputted is invalid. Try again.")
 
 
-
-def main_menu(song_client: WOQLClient) -> None:
+def main_menu(song_journal: SongJournal,
+              song_repository: SongRepository) -> None:
     """Main menu for user to choose actions."""
     while True:
         choice = input("Please enter a decision.\n"
@@ -318,15 +196,15 @@ def main_menu(song_client: WOQLClient) -> None:
                        "[6] Exit.\n")
 
         if int(choice) == 1:
-            view_songs(song_client)
+            view_songs(song_repository)
         elif int(choice) == 2:
-            add_menu(song_client)
+            add_menu(song_journal)
         elif int(choice) == 3:
-            remove_menu(song_client)
+            remove_menu(song_journal)
         elif int(choice) == 4:
-            edit_menu(song_client)
+            edit_menu(song_journal)
         elif int(choice) == 5:
-            find_menu(song_client)
+            find_menu(song_repository)
         elif int(choice) == 6:
             break
         else:
@@ -334,5 +212,16 @@ def main_menu(song_client: WOQLClient) -> None:
 
 
 if __name__ == "__main__":
-    client = connect_server()
-    main_menu(client)
+    # Kept next to the script so that pending edits are found again
+    # whichever directory the script is started from.
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    journal_path = os.path.join(script_dir, "a231songs.journal")
+
+    try:
+        journal = SongJournal(journal_path, connect_server)
+    except JournalInUseError as error:
+        print(str(error) + " Please close the other copy and try again.")
+    else:
+        journal.start()
+        main_menu(journal, TerminusSongRepository(connect_server))
+        journal.close()
@@ -0,0 +1,310 @@
+import json
+import logging
+import os
+import threading
+import time
+import warnings
+from typing import Callable, List
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; msvcrt provides the equivalent lock.
+    fcntl = None
+    import msvcrt
+
+# Addressing a known issue regarding warnings in the TerminusDB code
+# Not PEP8 friendly but the warning needs to ignored before importing
+# terminusDB modules
+warnings.filterwarnings("ignore", message="woqlview need "
+                                          "to be used in Jupyter notebook.\n")
+
+from terminusdb_client import WOQLQuery, WOQLClient
+
+from song_repository import is_refusal
+
+logger = logging.getLogger(__name__)
+
+
+class JournalInUseError(Exception):
+    """Raised when another process already has the journal open."""
+
+
+def add_song_query(entry: dict) -> WOQLQuery:
+    """Builds the query for a queued song insertion."""
+    args = entry["args"]
+    return WOQLQuery().insert("doc:" + args["title"], "scm:Song") \
+        .property("scm:artist", args["artist"]) \
+        .property("scm:length", args["length"]) \
+        .property("scm:album", args["album"])
+
+
+def remove_song_query(entry: dict) -> WOQLQuery:
+    """Builds the query for a queued song removal."""
+    return WOQLQuery().delete_object("doc:" + entry["args"]["title"])
+
+
+def edit_song_query(entry: dict) -> WOQLQuery:
+    """Builds the query for a queued property edit. The edit is
+    optional so that editing a missing song does not fail the rest of
+    its batch, and its variable is named after the entry so that edits
+    in the same batch do not bind to each other's values."""
+    args = entry["args"]
+    doc = "doc:" + args["title"]
+    old_value = "v:old_" + str(entry["seq"])
+    return WOQLQuery().opt(WOQLQuery().woql_and(
+        WOQLQuery().triple(doc, args["property"], old_value),
+        WOQLQuery().delete_triple(doc, args["property"], old_value),
+        WOQLQuery().add_triple(doc, args["property"], args["value"]),
+    ))
+
+
+QUERY_BUILDERS = {
+    "add": add_song_query,
+    "remove": remove_song_query,
+    "edit": edit_song_query,
+}
+
+
+def queued_message(action: str, pending: int) -> str:
+    """Tells the user an edit was queued rather than applied."""
+    return "Queued " + action + ". " + str(pending) + \
+        " edit(s) waiting to be sent to the database.\n"
+
+
+class SongJournal:
+    """Append-only local journal of song edits.
+
+    add_song(), remove_song() and edit_song() record an edit on disk and
+    return straight away, without waiting for the server. A background
+    flusher replays the recorded edits to the server, up to batch_size
+    of them per transaction, retrying with exponential backoff while the
+    server is unreachable or answers with a server error. Edits that
+    have not been replayed when the program exits are replayed on the
+    next start. An edit the server refuses with a 4xx response is logged
+    and moved to the .rejected file so that the edits behind it can
+    still be replayed. terminusdb-client sets no request timeout, so a
+    server that accepts a replay but never answers holds the flusher
+    up until it does; the edits stay in the journal meanwhile.
+
+    Reads in a transaction do not see its own writes, so a batch never
+    holds two edits to the same song; the second starts a new batch.
+
+    Replay is at-least-once: if the program stops between a batch
+    committing and its checkpoint being written, that batch is replayed
+    again, which the add, remove and edit queries tolerate."""
+
+    def __init__(self, path: str, connect: Callable[[], WOQLClient],
+                 batch_size: int = 50, min_delay: float = 1.0,
+                 max_delay: float = 60.0) -> None:
+        self.path = path
+        self.checkpoint_path = path + ".ckpt"
+        self.rejected_path = path + ".rejected"
+        self.connect = connect
+        self.batch_size = batch_size
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._client = None
+
+        # Held for as long as the journal is open, so that a second copy
+        # of the program cannot interleave or truncate this one's edits.
+        self._lock_file = open(path + ".lock", "a")
+        if not self._try_lock():
+            self._lock_file.close()
+            raise JournalInUseError(path + " is in use by another process.")
+
+        self._applied = self._read_checkpoint()
+        self._pending = [entry for entry in self._read_entries()
+                         if entry["seq"] > self._applied]
+        self._next_seq = max([self._applied] +
+                             [entry["seq"] for entry in self._pending]) + 1
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(),
+                            fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def _read_checkpoint(self) -> int:
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as checkpoint:
+            return int(checkpoint.read() or 0)
+
+    def _read_entries(self) -> List[dict]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb+") as journal:
+            data = journal.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                # A torn final line means the write never returned, so
+                # the edit was never acknowledged. Cut it off so that
+                # the next append starts on a fresh line.
+                logger.warning("Discarding a partly written edit at the "
+                               "end of %s.", self.path)
+                journal.truncate(complete)
+                journal.flush()
+                os.fsync(journal.fileno())
+
+        entries = []
+        for line in data[:complete].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.error("Skipping unreadable line in %s: %r",
+                             self.path, line)
+        return entries
+
+    def _write_checkpoint(self, seq: int) -> None:
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w") as checkpoint:
+            checkpoint.write(str(seq))
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+    def append(self, op: str, args: dict) -> None:
+        """Durably records an edit and wakes the flusher."""
+        if op not in QUERY_BUILDERS:
+            raise ValueError("Unknown journal operation: " + op)
+
+        with self._lock:
+            entry = {"seq": self._next_seq, "op": op, "args": args}
+            with open(self.path, "a") as journal:
+                journal.write(json.dumps(entry) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            self._next_seq += 1
+            self._pending.append(entry)
+        self._wake.set()
+
+    def add_song(self, title: str, length: str, artist: str,
+                 album: str) -> int:
+        """Queues a song to be added and returns the edits pending."""
+        self.append("add", {"title": title, "artist": artist,
+                            "length": length, "album": album})
+        return self.pending()
+
+    def remove_song(self, title: str) -> int:
+        """Queues a song to be removed and returns the edits pending."""
+        self.append("remove", {"title": title})
+        return self.pending()
+
+    def edit_song(self, title: str, song_property: str, value: str) -> int:
+        """Queues a change to one of a song's properties, such as
+        "scm:artist", and returns the edits pending."""
+        self.append("edit", {"title": title, "property": song_property,
+                             "value": value})
+        return self.pending()
+
+    def pending(self) -> int:
+        """Returns how many recorded edits have not been replayed."""
+        with self._lock:
+            return len(self._pending)
+
+    def start(self) -> None:
+        """Starts the background flusher."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Gives the flusher up to timeout seconds to replay what is
+        left, then stops it. Anything left over stays in the journal."""
+        deadline = time.monotonic() + timeout
+        if self._thread is not None:
+            while self.pending() and time.monotonic() < deadline:
+                time.sleep(0.1)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+        self._lock_file.close()
+
+    def _next_batch(self, batch_size: int) -> List[dict]:
+        """Returns the next pending edits to replay together, stopping
+        before the first one whose song is already in the batch."""
+        batch = []
+        titles = set()
+        with self._lock:
+            for entry in self._pending[:batch_size]:
+                if entry["args"]["title"] in titles:
+                    break
+                titles.add(entry["args"]["title"])
+                batch.append(entry)
+        return batch
+
+    def _run(self) -> None:
+        delay = self.min_delay
+        # After a batch is refused, its edits are replayed one at a time
+        # up to this sequence number to find the one at fault.
+        isolate_through = 0
+        while not self._stop.is_set():
+            with self._lock:
+                first = self._pending[0]["seq"] if self._pending else None
+            if first is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            batch = self._next_batch(
+                1 if first <= isolate_through else self.batch_size)
+            try:
+                if self._client is None:
+                    self._client = self.connect()
+                self._replay(batch)
+            except Exception as error:
+                if self._client is None or not is_refusal(error):
+                    # Server down, restarting or overloaded: drop the
+                    # connection and try again later.
+                    logger.info("Could not replay queued edits, retrying "
+                                "in %s seconds: %s", delay, error)
+                    self._client = None
+                    self._stop.wait(delay)
+                    delay = min(delay * 2, self.max_delay)
+                elif len(batch) > 1:
+                    isolate_through = batch[-1]["seq"]
+                else:
+                    self._reject(batch[0], error)
+                continue
+
+            delay = self.min_delay
+            self._mark_applied(batch[-1]["seq"])
+
+    def _replay(self, batch: List[dict]) -> None:
+        queries = [QUERY_BUILDERS[entry["op"]](entry) for entry in batch]
+        WOQLQuery().woql_and(*queries).execute(
+            self._client, "Replayed " + str(len(batch)) + " queued edit(s)")
+
+    def _reject(self, entry: dict, error: Exception) -> None:
+        """Moves an edit the server refused to the rejected file."""
+        logger.error("The database refused the queued %s of %s, it has "
+                     "been moved to %s: %s", entry["op"],
+                     entry["args"]["title"], self.rejected_path, error)
+        with open(self.rejected_path, "a") as rejected:
+            rejected.write(json.dumps({"entry": entry,
+                                       "error": str(error)}) + "\n")
+            rejected.flush()
+            os.fsync(rejected.fileno())
+        self._mark_applied(entry["seq"])
+
+    def _mark_applied(self, seq: int) -> None:
+        with self._lock:
+            self._write_checkpoint(seq)
+            self._applied = seq
+            self._pending = [entry for entry in self._pending
+                             if entry["seq"] > seq]
+            if not self._pending:
+                # Everything has been replayed, so the journal can be
+                # emptied. The checkpoint keeps the sequence numbering.
+                open(self.path, "w").close()
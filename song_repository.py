@@ -0,0 +1,255 @@
+import json
+import os
+import warnings
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, \
+    Tuple
+
+# Addressing a known issue regarding warnings in the TerminusDB code
+# Not PEP8 friendly but the warning needs to ignored before importing
+# terminusDB modules
+warnings.filterwarnings("ignore", message="woqlview need "
+                                          "to be used in Jupyter notebook.\n")
+
+from terminusdb_client import WOQLQuery, WOQLClient
+from terminusdb_client.woqlclient.errors import APIError
+
+
+class ServerUnavailableError(Exception):
+    """Raised when the database cannot be reached or cannot answer."""
+
+
+def is_refusal(error: Exception) -> bool:
+    """Returns whether error is the server refusing a request (a 4xx
+    response), which retrying will not fix. Anything else, such as a
+    dropped connection or a 5xx from a restarting server, may succeed
+    if tried again later."""
+    return isinstance(error, APIError) and error.status_code is not None \
+        and 400 <= error.status_code < 500
+
+
+class Song(NamedTuple):
+    """A single decoded scm:Song document."""
+    name: str
+    album: str
+    artist: str
+    length: str
+
+
+def song_name(iri: str) -> str:
+    """Returns the song title from a song document IRI."""
+    return iri.split("data/", 1)[-1]
+
+
+def decode_bindings(bindings: Iterable[dict]) -> Dict[str, Dict[str, list]]:
+    """Groups the bindings of a v:song, v:property, v:value query by
+    song IRI and then by property name, e.g.
+    {"terminusdb:///data/Ring01": {"artist": ["..."], ...}}."""
+    songs = {}
+    for binding in bindings:
+        name = binding['property'].split("#")[-1]
+        value = binding['value']
+        if isinstance(value, dict):
+            value = value['@value']
+        songs.setdefault(binding['song'], {}).setdefault(name, []) \
+            .append(value)
+    return songs
+
+
+def to_song(iri: str, properties: Dict[str, list]) -> Song:
+    """Builds a Song from its grouped properties. A missing property
+    is shown as an empty string rather than shifting other songs."""
+    def first(name: str) -> str:
+        values = properties.get(name)
+        return str(values[0]) if values else ""
+
+    return Song(song_name(iri), first("album"), first("artist"),
+                first("length"))
+
+
+def connect_server(dbid: str, commit: Optional[str] = None) -> WOQLClient:
+    """Connects to the local server and returns a client for dbid. If
+    commit is given, the client reads the database as of that commit
+    rather than the head of the branch."""
+    server_url = "https://127.0.0.1:6363"
+    user = "admin"
+    account = "admin"
+    key = "root"
+
+    song_client = WOQLClient(server_url)
+    song_client.connect(user=user, account=account, key=key, db=dbid)
+    if commit:
+        song_client.ref(commit)
+
+    return song_client
+
+
+def head_commit(song_client: WOQLClient) -> str:
+    """Returns the ID of the commit at the head of the client's branch,
+    read from the database's commit graph."""
+    branch = song_client.checkout()
+    song_client.checkout("_commits")
+    try:
+        commit_query = WOQLQuery().woql_and(
+            WOQLQuery().triple("v:branch", "ref:branch_name", branch),
+            WOQLQuery().triple("v:branch", "ref:ref_commit", "v:commit"),
+            WOQLQuery().triple("v:commit", "ref:commit_id", "v:commit_id"),
+        ).execute(song_client)
+    finally:
+        song_client.checkout(branch)
+
+    return commit_query.get("bindings")[0]['commit_id']['@value']
+
+
+def fetch_song_properties(song_client: WOQLClient,
+                          iris: Optional[List[str]] = None,
+                          chunk_size: int = 500) \
+        -> Dict[str, Dict[str, list]]:
+    """Returns every property of the given songs, or of every scm:Song
+    in a single query if iris is None. Given songs are fetched
+    chunk_size at a time."""
+    if iris is None:
+        song_query = WOQLQuery().woql_and(
+            WOQLQuery().triple("v:song", "rdf:type", "scm:Song"),
+            WOQLQuery().triple("v:song", "v:property", "v:value"),
+        ).execute(song_client)
+        return decode_bindings(song_query.get("bindings"))
+
+    songs = {iri: {} for iri in iris}
+    for start in range(0, len(iris), chunk_size):
+        # member() only treats prefixed names as documents, full IRIs
+        # would be matched as plain strings.
+        docs = ["doc:" + song_name(iri)
+                for iri in iris[start:start + chunk_size]]
+        song_query = WOQLQuery().woql_and(
+            WOQLQuery().member("v:song", docs),
+            WOQLQuery().triple("v:song", "v:property", "v:value"),
+        ).execute(song_client)
+        for iri, properties in \
+                decode_bindings(song_query.get("bindings")).items():
+            songs[iri] = properties
+    return songs
+
+
+class SongRepository(ABC):
+    """Read access to the songs in the catalog."""
+
+    @abstractmethod
+    def songs(self) -> List[Song]:
+        """Returns every song in the catalog."""
+
+    def find(self, field: str, value: str) -> List[Song]:
+        """Returns the songs whose field equals value, in a single
+        fetch and a single scan."""
+        return [song for song in self.songs()
+                if getattr(song, field) == value]
+
+
+class TerminusSongRepository(SongRepository):
+    """Songs read live from a TerminusDB database. The connection is
+    only made on the first read, so the scripts can start while the
+    server is down."""
+
+    def __init__(self, connect: Callable[[], WOQLClient]) -> None:
+        self.connect = connect
+        self.song_client = None
+
+    def songs(self) -> List[Song]:
+        try:
+            if self.song_client is None:
+                self.song_client = self.connect()
+            songs = fetch_song_properties(self.song_client)
+        except Exception as error:
+            if is_refusal(error):
+                raise
+            raise ServerUnavailableError(str(error)) from error
+
+        return [to_song(iri, properties)
+                for iri, properties in songs.items()]
+
+
+class SnapshotSongRepository(SongRepository):
+    """Songs read from a JSON snapshot on disk. If the snapshot is
+    missing it is built from source. Edits are not written through, so
+    the snapshot goes stale after adding, removing or editing songs
+    until refresh() is called. Neither playlist script uses it; it is
+    for tools that read the catalog repeatedly without editing it."""
+
+    def __init__(self, path: str,
+                 source: Optional[SongRepository] = None) -> None:
+        self.path = path
+        self.source = source
+        self._songs = None
+
+    def songs(self) -> List[Song]:
+        if self._songs is None:
+            if os.path.exists(self.path):
+                with open(self.path) as snapshot:
+                    self._songs = [Song(*song)
+                                   for song in json.load(snapshot)]
+            else:
+                self.refresh()
+        return list(self._songs)
+
+    def refresh(self) -> None:
+        """Fetches the songs from source and rewrites the snapshot."""
+        if self.source is None:
+            raise FileNotFoundError("No snapshot at " + self.path +
+                                    " and no source to build it from.")
+
+        self._songs = self.source.songs()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as snapshot:
+            json.dump(self._songs, snapshot)
+        os.replace(temp_path, self.path)
+
+
+class MemorySongRepository(SongRepository):
+    """Songs held in memory, mainly for testing."""
+
+    def __init__(self, songs: Iterable[Song] = ()) -> None:
+        self._songs = list(songs)
+
+    def songs(self) -> List[Song]:
+        return list(self._songs)
+
+
+def print_song(song: Song) -> None:
+    """Prints out a single song."""
+    print("Song Name: " + song.name)
+    print("Song Album: " + song.album)
+    print("Song Artist: " + song.artist)
+    print("Song Length: " + song.length)
+    print()
+
+
+def print_songs(songs: Iterable[Song]) -> None:
+    """Prints out each of the songs."""
+    for song in songs:
+        print_song(song)
+
+
+# find_menu search choices: the Song field to match on and how
+# matches on that field are described.
+SEARCH_FIELDS: Dict[int, Tuple[str, str]] = {
+    1: ("name", "the song "),
+    2: ("album", "the album "),
+    3: ("artist", "the artist "),
+    4: ("length", "length "),
+}
+
+
+def search_songs(song_repository: SongRepository, choice: int,
+                 value: str) -> List[Song]:
+    """Prints and returns the songs matching a find_menu search."""
+    field, description = SEARCH_FIELDS[choice]
+    if field == "length":
+        # Lengths are whole seconds, so "090" finds "90".
+        value = str(int(value))
+
+    matches = song_repository.find(field, value)
+
+    print("\nFound " + str(len(matches)) + " instance(s) of " +
+          description + value + " in the Database\n")
+    print_songs(matches)
+    return matches
@@ -0,0 +1,137 @@
+import json
+import os
+
+import catalog_export
+from catalog_export import export_shard, merge_reports, partition, \
+    shard_of, verify_song
+from song_repository import fetch_song_properties, head_commit
+
+SONGS = {
+    "Ring01": {"artist": "Nokia", "length": "90", "album": "Rings"},
+    "Ring02": {"artist": "Motorola", "length": "45", "album": "Rings"},
+    "Ring03": {"artist": "Nokia", "length": "", "album": "Bells"},
+}
+
+
+def iri(title: str) -> str:
+    return "terminusdb:///data/" + title
+
+
+class FakeClient:
+    """Answers member() property queries from SONGS and records the
+    documents each query asked for."""
+
+    def __init__(self) -> None:
+        self.branch = "main"
+        self.queries = []
+
+    def checkout(self, branch=None) -> str:
+        if branch:
+            self.branch = branch
+        return self.branch
+
+    def query(self, woql_query, commit_msg=None, file_dict=None) -> dict:
+        query = woql_query.to_dict()
+        if self.branch == "_commits":
+            self.queries.append(("_commits", json.dumps(query)))
+            return {"bindings": [{"commit_id": {"@value": "abc123"}}]}
+
+        member = query["woql:query_list"][0]["woql:query"]
+        docs = [element["woql:node"] for element
+                in member["woql:member_list"]["woql:array_element"]]
+        self.queries.append(docs)
+
+        bindings = []
+        for doc in docs:
+            title = doc.split("doc:", 1)[1]
+            for name, value in SONGS.get(title, {}).items():
+                bindings.append({
+                    "song": iri(title),
+                    "property": "terminusdb:///schema#" + name,
+                    "value": {"@type": "xsd:string", "@value": value}})
+        return {"bindings": bindings}
+
+
+def test_verify_song_accepts_a_well_formed_song():
+    assert verify_song({"artist": ["Nokia"], "length": ["90"],
+                        "album": ["Rings"]}) == []
+
+
+def test_verify_song_reports_each_problem():
+    assert verify_song({"artist": ["Nokia", "Motorola"],
+                        "length": ["0"]}) == [
+        "artist has 2 values, expected 1",
+        "length 0 is not a positive number of seconds",
+        "missing album",
+    ]
+    assert verify_song({"artist": [" "], "length": ["ninety"],
+                        "album": ["Rings"]}) == [
+        "empty artist",
+        "length ninety is not a positive number of seconds",
+    ]
+
+
+def test_partition_covers_every_iri_once_and_is_stable():
+    iris = ["terminusdb:///data/Ring%02d" % number for number in range(50)]
+    partitions = partition(iris, 4)
+
+    assert len(partitions) == 4
+    assert sorted(sum(partitions, [])) == iris
+    for shard, shard_iris in enumerate(partitions):
+        assert all(shard_of(iri, 4) == shard for iri in shard_iris)
+
+
+def test_merge_reports_adds_up_shards():
+    merged = merge_reports([
+        {"shard": 1, "songs": 3, "problems": {"b": ["missing album"]}},
+        {"shard": 0, "songs": 2, "problems": {"a": ["empty artist"]}},
+        {"shard": 2, "songs": 0, "problems": {}},
+    ])
+
+    assert merged == {"shards": 3, "songs": 5, "invalid": 2,
+                      "problems": {"a": ["empty artist"],
+                                   "b": ["missing album"]}}
+
+
+def test_fetch_song_properties_chunks_member_queries():
+    client = FakeClient()
+    iris = [iri("Ring01"), iri("Ring02"), iri("Gone")]
+
+    songs = fetch_song_properties(client, iris, chunk_size=2)
+
+    assert client.queries == [["doc:Ring01", "doc:Ring02"], ["doc:Gone"]]
+    assert songs[iri("Ring02")] == {"artist": ["Motorola"],
+                                    "length": ["45"], "album": ["Rings"]}
+    assert songs[iri("Gone")] == {}
+
+
+def test_export_shard_writes_and_verifies_its_songs(tmp_path, monkeypatch):
+    connections = []
+
+    def connect_server(dbid, commit=None):
+        connections.append((dbid, commit))
+        return FakeClient()
+
+    monkeypatch.setattr(catalog_export, "connect_server", connect_server)
+    report = export_shard(("a231songs", "abc123", 3,
+                           [iri("Ring01"), iri("Ring03")], str(tmp_path)))
+
+    assert connections == [("a231songs", "abc123")]
+    assert report == {"shard": 3, "songs": 2,
+                      "problems": {iri("Ring03"): ["empty length"]}}
+    with open(os.path.join(str(tmp_path), "songs-00003.jsonl")) as shard:
+        lines = [json.loads(line) for line in shard]
+    assert lines[0] == {"iri": iri("Ring01"),
+                        "properties": {"artist": ["Nokia"],
+                                       "length": ["90"],
+                                       "album": ["Rings"]}}
+    assert lines[1]["iri"] == iri("Ring03")
+
+
+def test_head_commit_reads_the_commit_graph():
+    client = FakeClient()
+
+    assert head_commit(client) == "abc123"
+    assert client.queries[0][0] == "_commits"
+    assert '"main"' in client.queries[0][1]
+    assert client.branch == "main"
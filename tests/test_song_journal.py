@@ -0,0 +1,200 @@
+import json
+import os
+import time
+
+import pytest
+import requests
+from terminusdb_client.woqlclient.errors import APIError
+
+from song_journal import JournalInUseError, SongJournal, queued_message
+
+
+class FakeClient:
+    """Records the transactions it is sent. Refuses any transaction
+    that mentions a title in refuse, is unreachable while down is above
+    zero, and fails each transaction with the next of errors while any
+    are left."""
+
+    def __init__(self, down: int = 0, refuse: tuple = (),
+                 errors: tuple = ()) -> None:
+        self.down = down
+        self.refuse = refuse
+        self.errors = list(errors)
+        self.transactions = []
+
+    def connect(self) -> "FakeClient":
+        if self.down:
+            self.down -= 1
+            raise requests.exceptions.ConnectionError("server is down")
+        return self
+
+    def query(self, woql_query, commit_msg=None, file_dict=None) -> dict:
+        if self.errors:
+            raise self.errors.pop(0)
+        query = json.dumps(woql_query.to_dict())
+        for title in self.refuse:
+            if "doc:" + title + '"' in query:
+                raise APIError("refused " + title, status_code=400)
+        self.transactions.append(query)
+        return {"bindings": []}
+
+
+def add(song_journal: SongJournal, title: str) -> None:
+    song_journal.add_song(title, "90", "Nokia", "Rings")
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "songs.journal")
+
+
+def test_unreplayed_edits_survive_a_restart(path):
+    client = FakeClient()
+    song_journal = SongJournal(path, client.connect)
+    add(song_journal, "Ring01")
+    add(song_journal, "Ring02")
+    song_journal.close()
+
+    song_journal = SongJournal(path, client.connect)
+    assert song_journal.pending() == 2
+    song_journal.start()
+    song_journal.close()
+
+    assert song_journal.pending() == 0
+    assert len(client.transactions) == 1
+
+
+def test_torn_tail_is_cut_off_before_appending(path):
+    song_journal = SongJournal(path, FakeClient().connect)
+    add(song_journal, "Ring01")
+    song_journal.close()
+    with open(path, "a") as journal:
+        journal.write('{"seq": 2, "op"')
+
+    song_journal = SongJournal(path, FakeClient().connect)
+    assert song_journal.pending() == 1
+    add(song_journal, "Ring02")
+    song_journal.close()
+
+    song_journal = SongJournal(path, FakeClient().connect)
+    assert song_journal.pending() == 2
+    assert [entry["args"]["title"] for entry in song_journal._pending] == \
+        ["Ring01", "Ring02"]
+    song_journal.close()
+
+
+def test_edits_are_batched(path):
+    client = FakeClient()
+    song_journal = SongJournal(path, client.connect, batch_size=3)
+    for number in range(5):
+        add(song_journal, "Ring0" + str(number))
+    song_journal.start()
+    song_journal.close()
+
+    assert song_journal.pending() == 0
+    assert len(client.transactions) == 2
+
+
+def test_edits_to_the_same_song_are_not_batched_together(path):
+    client = FakeClient()
+    song_journal = SongJournal(path, client.connect)
+    add(song_journal, "Ring01")
+    song_journal.edit_song("Ring01", "scm:artist", "Motorola")
+    add(song_journal, "Ring02")
+    song_journal.start()
+    song_journal.close()
+
+    assert len(client.transactions) == 2
+    assert "Motorola" in client.transactions[1]
+    assert "Ring02" in client.transactions[1]
+
+
+def test_backs_off_while_the_server_is_down(path):
+    client = FakeClient(down=2)
+    song_journal = SongJournal(path, client.connect, min_delay=0.01)
+    add(song_journal, "Ring01")
+    song_journal.start()
+    wait_until(lambda: song_journal.pending() == 0)
+    song_journal.close()
+
+    assert client.down == 0
+    assert len(client.transactions) == 1
+
+
+def test_server_errors_are_retried_not_rejected(path):
+    client = FakeClient(errors=(
+        APIError("restarting", status_code=503),
+        requests.exceptions.ChunkedEncodingError("connection dropped"),
+    ))
+    song_journal = SongJournal(path, client.connect, min_delay=0.01)
+    add(song_journal, "Ring01")
+    add(song_journal, "Ring02")
+    song_journal.start()
+    wait_until(lambda: song_journal.pending() == 0)
+    song_journal.close()
+
+    assert len(client.transactions) == 1
+    assert "Ring01" in client.transactions[0]
+    assert "Ring02" in client.transactions[0]
+    assert not os.path.exists(path + ".rejected")
+
+
+def test_refused_edit_is_moved_aside(path):
+    client = FakeClient(refuse=("Bad",))
+    song_journal = SongJournal(path, client.connect)
+    add(song_journal, "Ring01")
+    add(song_journal, "Bad")
+    add(song_journal, "Ring02")
+    song_journal.start()
+    wait_until(lambda: song_journal.pending() == 0)
+    song_journal.close()
+
+    replayed = "".join(client.transactions)
+    assert "Ring01" in replayed and "Ring02" in replayed
+    with open(path + ".rejected") as rejected:
+        [line] = rejected.readlines()
+    assert json.loads(line)["entry"]["args"]["title"] == "Bad"
+
+
+def test_checkpoint_and_truncation(path):
+    client = FakeClient()
+    song_journal = SongJournal(path, client.connect)
+    add(song_journal, "Ring01")
+    add(song_journal, "Ring02")
+    song_journal.start()
+    song_journal.close()
+
+    with open(path) as journal:
+        assert journal.read() == ""
+    with open(path + ".ckpt") as checkpoint:
+        assert checkpoint.read() == "2"
+
+    song_journal = SongJournal(path, client.connect)
+    add(song_journal, "Ring03")
+    assert song_journal._pending[0]["seq"] == 3
+    song_journal.close()
+
+
+def test_journal_cannot_be_opened_twice(path):
+    song_journal = SongJournal(path, FakeClient().connect)
+    with pytest.raises(JournalInUseError):
+        SongJournal(path, FakeClient().connect)
+    song_journal.close()
+
+
+def test_queueing_reports_pending_edits(path):
+    song_journal = SongJournal(path, FakeClient().connect)
+
+    assert song_journal.add_song("Ring01", "90", "Nokia", "Rings") == 1
+    assert song_journal.remove_song("Ring02") == 2
+    assert queued_message("removing Ring02", 2) == \
+        "Queued removing Ring02. 2 edit(s) waiting to be sent to the " \
+        "database.\n"
+    song_journal.close()
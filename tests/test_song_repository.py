@@ -0,0 +1,94 @@
+import pytest
+import requests
+from terminusdb_client.woqlclient.errors import APIError
+
+from song_repository import MemorySongRepository, ServerUnavailableError, \
+    SnapshotSongRepository, Song, TerminusSongRepository, decode_bindings, \
+    search_songs, to_song
+
+SONGS = [
+    Song("Ring01", "Rings", "Nokia", "90"),
+    Song("Ring02", "Rings", "Motorola", "45"),
+    Song("Ring03", "Bells", "Nokia", "90"),
+]
+
+
+def binding(song: str, name: str, value) -> dict:
+    return {"song": "terminusdb:///data/" + song,
+            "property": "terminusdb:///schema#" + name,
+            "value": value}
+
+
+def test_decode_bindings_groups_by_song_and_property():
+    bindings = [
+        binding("Ring01", "artist", {"@type": "xsd:string",
+                                     "@value": "Nokia"}),
+        binding("Ring02", "album", {"@type": "xsd:string",
+                                    "@value": "Rings"}),
+        binding("Ring01", "length", {"@type": "xsd:string",
+                                     "@value": "90"}),
+        binding("Ring01", "type", "terminusdb:///schema#Song"),
+    ]
+
+    assert decode_bindings(bindings) == {
+        "terminusdb:///data/Ring01": {"artist": ["Nokia"],
+                                      "length": ["90"],
+                                      "type": ["terminusdb:///schema#Song"]},
+        "terminusdb:///data/Ring02": {"album": ["Rings"]},
+    }
+
+
+def test_missing_property_does_not_shift_other_songs():
+    songs = decode_bindings([
+        binding("Ring01", "artist", {"@value": "Nokia"}),
+        binding("Ring02", "artist", {"@value": "Motorola"}),
+        binding("Ring02", "album", {"@value": "Rings"}),
+        binding("Ring02", "length", {"@value": 45}),
+    ])
+
+    assert [to_song(iri, properties) for iri, properties in songs.items()] \
+        == [Song("Ring01", "", "Nokia", ""),
+            Song("Ring02", "Rings", "Motorola", "45")]
+
+
+def test_find_matches_on_field():
+    song_repository = MemorySongRepository(SONGS)
+
+    assert song_repository.find("artist", "Nokia") == [SONGS[0], SONGS[2]]
+    assert song_repository.find("album", "Nowhere") == []
+
+
+def test_search_songs_prints_matches(capsys):
+    matches = search_songs(MemorySongRepository(SONGS), 4, "090")
+
+    assert matches == [SONGS[0], SONGS[2]]
+    output = capsys.readouterr().out
+    assert "Found 2 instance(s) of length 90 in the Database" in output
+    assert "Song Name: Ring03" in output
+
+
+def test_snapshot_is_built_from_source_and_reused(tmp_path):
+    path = str(tmp_path / "songs.json")
+    SnapshotSongRepository(path, MemorySongRepository(SONGS)).songs()
+
+    snapshot = SnapshotSongRepository(path)
+    assert snapshot.songs() == SONGS
+
+    snapshot.songs().clear()
+    assert snapshot.songs() == SONGS
+
+
+def test_unreachable_server_is_reported_but_refusals_are_not():
+    def connect(error):
+        def raise_error():
+            raise error
+        return raise_error
+
+    for error in (requests.exceptions.ConnectionError("down"),
+                  APIError("restarting", status_code=503)):
+        with pytest.raises(ServerUnavailableError):
+            TerminusSongRepository(connect(error)).songs()
+
+    with pytest.raises(APIError):
+        TerminusSongRepository(
+            connect(APIError("denied", status_code=403))).songs()